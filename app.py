@@ -1,30 +1,480 @@
 import streamlit as st
 from gtts import gTTS
 import io
+import os
 import base64
+import importlib
+import threading
 import random
 import time
-from data import flashcard_data, thai_translations, thai_quotes
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import data
+
+# --- Listen Mode Settings ---
+LISTEN_PAUSE_SECONDS = 2
+LISTEN_LOOKAHEAD = 3  # Cards synthesized ahead of the one being played
+LISTEN_POLL_SECONDS = 0.5  # How often the player checks whether the current card has finished
+LISTEN_SLACK_SECONDS = 1.5  # Extra time per card for the browser to load and start the clip
+
+# gTTS returns MPEG-2 Layer III, 24 kHz, 32 kbit/s, mono. A frame with empty
+# side info decodes to 576 samples (24 ms) of silence, so a pause is just
+# this frame repeated and can be concatenated with the speech frames.
+SILENT_MP3_FRAME = b"\xff\xf3\x44\xc0" + bytes(92)
+SILENT_MP3_FRAME_SECONDS = 576 / 24000
+MP3_BITRATE = 32000
+
+# --- Review Event Log Settings ---
+EVENTS_DB_PATH = "review_events.sqlite3"
+EVENT_BUFFER_SIZE = 256  # Events kept per session before a batch is flushed
+EVENT_FLUSH_BATCH = 16  # Flush on the next run once this many events are pending...
+EVENT_FLUSH_SECONDS = 10  # ...or once the oldest pending event is this old
+# "finish" ends a card view without navigating: last card marked, range applied or listening started.
+EVENT_ACTIONS = ["next", "prev", "remembered", "repeat", "finish"]
+VIEW_ACTIONS = [EVENT_ACTIONS.index(action) for action in ("next", "prev", "finish")]
+CARD_STATS_MERGE = (
+    "ON CONFLICT(card_id) DO UPDATE SET "
+    "views = views + excluded.views, "
+    "dwell_total = dwell_total + excluded.dwell_total, "
+    "audio_views = audio_views + excluded.audio_views, "
+    "translation_views = translation_views + excluded.translation_views, "
+    "remembered = remembered + excluded.remembered, "
+    "repeats = repeats + excluded.repeats"
+)
+EVENT_COLUMNS = {
+    "card_id": np.uint32,
+    "action": np.uint8,
+    "dwell": np.float32,
+    "audio_played": np.bool_,
+    "translation_viewed": np.bool_,
+    "timestamp": np.float64,
+}
+
+# --- Deck Reload Settings ---
+DATA_PATH = data.__file__
 
 # --- Functions ---
 
-@st.cache_data
-def generate_audio(text):
-    """Generates audio and returns it as a Base64 encoded Data URI"""
+@st.cache_data(show_spinner=False)
+def generate_audio_bytes(text):
+    """Generates audio and returns the raw MP3 bytes"""
     audio_bytes = io.BytesIO()
     try:
         tts = gTTS(text=text, lang='ru', slow=False)
         tts.write_to_fp(audio_bytes)
-        audio_bytes.seek(0)
-        b64 = base64.b64encode(audio_bytes.read()).decode('utf-8')
-        audio_uri = f"data:audio/mp3;base64,{b64}"
-        return audio_uri
+        return audio_bytes.getvalue()
     except Exception as e:
         print(f"Error generating audio: {e}")
         return None
 
 
-def initialize_session_state():
+def generate_audio(text):
+    """Generates audio and returns it as a Base64 encoded Data URI"""
+    audio = generate_audio_bytes(text)
+    if audio is None:
+        return None
+    b64 = base64.b64encode(audio).decode('utf-8')
+    return f"data:audio/mp3;base64,{b64}"
+
+
+@st.cache_resource(show_spinner=False)
+def get_listen_executor():
+    """Background workers shared by all sessions for listen-mode synthesis."""
+    return ThreadPoolExecutor(max_workers=2)
+
+
+def listen_card_audio(key):
+    """Returns one card as a single MP3 clip: question, pause, answer, pause."""
+    question_audio = generate_audio_bytes(key)
+    answer_audio = generate_audio_bytes(flashcard_data[key])
+    if question_audio is None and answer_audio is None:
+        return None
+    pause = SILENT_MP3_FRAME * round(LISTEN_PAUSE_SECONDS / SILENT_MP3_FRAME_SECONDS)
+    return b"".join(part for part in (question_audio, pause, answer_audio, pause) if part)
+
+
+def prefetch_listen_audio():
+    """Keeps synthesis running for the cards just ahead of the playhead.
+
+    Only those cards' clips are held by the session; clips behind the
+    playhead are dropped as it moves on.
+    """
+    ctx = get_script_run_ctx()
+
+    def synthesize(key):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return listen_card_audio(key)
+
+    index = st.session_state.listen_index
+    ahead = st.session_state.card_keys[index:index + LISTEN_LOOKAHEAD]
+    prefetch = st.session_state.listen_prefetch
+    for key in list(prefetch):
+        if key not in ahead:
+            del prefetch[key]
+    for key in ahead:
+        if key not in prefetch:
+            prefetch[key] = get_listen_executor().submit(synthesize, key)
+
+
+def start_listening():
+    end_card_view("finish")
+    flush_review_events()
+    st.session_state.listen_mode = True
+    st.session_state.listen_index = 0
+    st.session_state.listen_clip_started_at = None
+    st.session_state.listen_clip_sent = False
+    st.session_state.listen_prefetch = {}
+
+
+def stop_listening():
+    st.session_state.listen_mode = False
+    st.session_state.listen_clip_started_at = None
+    st.session_state.listen_clip_sent = False
+    st.session_state.listen_prefetch = {}
+    start_card_view()
+
+
+@st.fragment(run_every=LISTEN_POLL_SECONDS)
+def listen_player():
+    """Plays the range card after card without user interaction.
+
+    The playhead lives in session state, so reruns of the rest of the page do
+    not restart playback. This is approximate, server-timed sequencing, not a
+    real incremental stream: the server never learns when the browser plays a
+    clip. A card's clock starts on the first poll after its clip was sent and
+    the card is over once the clip's duration plus some slack has elapsed.
+    """
+    if st.session_state.listen_index >= st.session_state.total_cards:
+        stop_listening()
+        st.rerun()
+    started_at = st.session_state.listen_clip_started_at
+    key = st.session_state.card_keys[st.session_state.listen_index]
+    future = st.session_state.listen_prefetch.get(key)
+    if started_at is not None and future is not None and future.done():
+        audio = future.result()
+        if audio is None or time.time() - started_at >= len(audio) * 8 / MP3_BITRATE + LISTEN_SLACK_SECONDS:
+            st.session_state.listen_index += 1
+            st.session_state.listen_clip_started_at = None
+            st.session_state.listen_clip_sent = False
+            if st.session_state.listen_index >= st.session_state.total_cards:
+                stop_listening()
+                st.rerun()
+            key = st.session_state.card_keys[st.session_state.listen_index]
+
+    prefetch_listen_audio()
+    number = st.session_state.listen_index + 1
+    st.progress(number / st.session_state.total_cards,
+                text=f"Карточка {number} из {st.session_state.total_cards}")
+    with st.container(border=True):
+        st.markdown(f"**{number}.** {key}")
+        future = st.session_state.listen_prefetch[key]
+        if not future.done():
+            st.caption("Подготовка аудио...")
+            return
+        audio = future.result()
+        if audio is None:
+            if st.session_state.listen_clip_started_at is None:
+                st.session_state.listen_clip_started_at = time.time()
+                st.toast("Ошибка генерации аудио!", icon="🚨")
+            return
+        if st.session_state.listen_clip_sent and st.session_state.listen_clip_started_at is None:
+            st.session_state.listen_clip_started_at = time.time()
+        st.audio(audio, format="audio/mp3", autoplay=True)
+        st.session_state.listen_clip_sent = True
+
+
+def card_id(key):
+    """Stable numeric id of a card, independent of its position in the deck"""
+    return zlib.crc32(key.encode('utf-8'))
+
+
+def open_event_store():
+    """Opens the local review event store, creating the tables if needed."""
+    conn = sqlite3.connect(EVENTS_DB_PATH)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS review_events ("
+        "card_id INTEGER, action INTEGER, dwell REAL, "
+        "audio_played INTEGER, translation_viewed INTEGER, timestamp REAL)"
+    )
+    # Running per-card totals, updated with every batch so the dashboard
+    # never has to scan the raw events.
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS card_stats ("
+        "card_id INTEGER PRIMARY KEY, views INTEGER, dwell_total REAL, "
+        "audio_views INTEGER, translation_views INTEGER, remembered INTEGER, repeats INTEGER)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS review_events_card_id ON review_events (card_id)")
+    # Renamed questions: events still buffered under an old id are moved on flush.
+    conn.execute("CREATE TABLE IF NOT EXISTS card_aliases (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+    return conn
+
+
+def new_event_buffer():
+    """Columnar ring buffer: one fixed-size array per event field."""
+    return {name: np.zeros(EVENT_BUFFER_SIZE, dtype=dtype) for name, dtype in EVENT_COLUMNS.items()}
+
+
+def aggregate_events(batch):
+    """Per-card totals of a batch of events, as rows for card_stats.
+
+    Views, dwell time and audio/translation use only count the events that
+    end a card view, since a mark is followed by leaving the same view.
+    """
+    ids, inverse = np.unique(batch["card_id"], return_inverse=True)
+    action = batch["action"]
+    navigation = np.isin(action, VIEW_ACTIONS)
+
+    def per_card(values):
+        return np.bincount(inverse, weights=values.astype(np.float64), minlength=len(ids))
+
+    totals = [
+        per_card(navigation).astype(np.int64),
+        per_card(np.where(navigation, batch["dwell"], 0)),
+        per_card(navigation & batch["audio_played"]).astype(np.int64),
+        per_card(navigation & batch["translation_viewed"]).astype(np.int64),
+        per_card(action == EVENT_ACTIONS.index("remembered")).astype(np.int64),
+        per_card(action == EVENT_ACTIONS.index("repeat")).astype(np.int64),
+    ]
+    return zip(ids.tolist(), *(column.tolist() for column in totals))
+
+
+def flush_review_events():
+    """Appends the not yet flushed events of this session to the store in one batch."""
+    written = st.session_state.events_written
+    # If earlier flushes failed the ring has wrapped and the oldest events are gone.
+    flushed = max(st.session_state.events_flushed, written - EVENT_BUFFER_SIZE)
+    if flushed == written:
+        return
+    rows = np.arange(flushed, written) % EVENT_BUFFER_SIZE
+    batch = {name: column[rows] for name, column in st.session_state.event_buffer.items()}
+    try:
+        conn = open_event_store()
+        with conn:
+            ids, inverse = np.unique(batch["card_id"], return_inverse=True)
+            aliases = dict(conn.execute(
+                f"SELECT old_id, new_id FROM card_aliases WHERE old_id IN ({', '.join('?' * len(ids))})",
+                ids.tolist(),
+            ).fetchall())
+            if aliases:
+                new_ids = np.array([aliases.get(old_id, old_id) for old_id in ids.tolist()], dtype=np.uint32)
+                batch["card_id"] = new_ids[inverse]
+            conn.executemany(
+                "INSERT INTO review_events VALUES (?, ?, ?, ?, ?, ?)",
+                zip(*(batch[name].tolist() for name in EVENT_COLUMNS)),
+            )
+            conn.executemany(
+                "INSERT INTO card_stats VALUES (?, ?, ?, ?, ?, ?, ?) " + CARD_STATS_MERGE,
+                aggregate_events(batch),
+            )
+        conn.close()
+        st.session_state.events_flushed = written
+    except sqlite3.Error as e:
+        print(f"Error flushing review events: {e}")
+
+
+def rename_card_events(renamed):
+    """Moves the event history of renamed questions to their new card ids."""
+    conn = open_event_store()
+    try:
+        with conn:
+            for old_key, new_key in renamed.items():
+                old_id, new_id = card_id(old_key), card_id(new_key)
+                conn.execute("UPDATE review_events SET card_id = ? WHERE card_id = ?", (new_id, old_id))
+                conn.execute(
+                    "INSERT INTO card_stats SELECT ?, views, dwell_total, audio_views, translation_views, "
+                    "remembered, repeats FROM card_stats WHERE card_id = ? " + CARD_STATS_MERGE,
+                    (new_id, old_id),
+                )
+                conn.execute("DELETE FROM card_stats WHERE card_id = ?", (old_id,))
+                conn.execute("UPDATE card_aliases SET new_id = ? WHERE new_id = ?", (new_id, old_id))
+                conn.execute("INSERT OR REPLACE INTO card_aliases VALUES (?, ?)", (old_id, new_id))
+    finally:
+        conn.close()
+
+
+def maybe_flush_review_events():
+    """Flushes once enough events are pending or the oldest one has waited too long."""
+    pending = st.session_state.events_written - st.session_state.events_flushed
+    if pending == 0:
+        return
+    oldest = st.session_state.event_buffer["timestamp"][st.session_state.events_flushed % EVENT_BUFFER_SIZE]
+    if pending >= EVENT_FLUSH_BATCH or time.time() - oldest >= EVENT_FLUSH_SECONDS:
+        flush_review_events()
+
+
+def log_review_event(action):
+    """Records an action on the current card together with how it was studied."""
+    current_key = st.session_state.card_keys[st.session_state.current_index]
+    now = time.time()
+    row = st.session_state.events_written % EVENT_BUFFER_SIZE
+    buffer = st.session_state.event_buffer
+    buffer["card_id"][row] = card_id(current_key)
+    buffer["action"][row] = EVENT_ACTIONS.index(action)
+    buffer["dwell"][row] = now - st.session_state.card_shown_at
+    buffer["audio_played"][row] = st.session_state.audio_played
+    buffer["translation_viewed"][row] = st.session_state.translation_viewed
+    buffer["timestamp"][row] = now
+    st.session_state.events_written += 1
+    if st.session_state.events_written - st.session_state.events_flushed >= EVENT_BUFFER_SIZE:
+        flush_review_events()
+
+
+def end_card_view(action):
+    """Logs the end of the current card view unless it was already counted."""
+    if st.session_state.card_keys and not st.session_state.view_logged:
+        log_review_event(action)
+        st.session_state.view_logged = True
+
+
+def start_card_view():
+    """Resets the per-card study tracking when a new card is shown."""
+    st.session_state.card_shown_at = time.time()
+    st.session_state.view_logged = False
+    st.session_state.audio_played = False
+    st.session_state.translation_viewed = False
+
+
+def load_card_analytics():
+    """Per-card totals of all learners' review events."""
+    conn = open_event_store()
+    try:
+        stats = pd.read_sql_query("SELECT * FROM card_stats", conn)
+    finally:
+        conn.close()
+    questions = {card_id(key): key for key in flashcard_data}
+    stats["question"] = stats["card_id"].map(questions)
+    stats = stats.dropna(subset=["question"])
+    views = stats["views"].where(stats["views"] > 0)
+    stats["avg_dwell"] = stats["dwell_total"] / views
+    stats["audio_rate"] = stats["audio_views"] / views
+    stats["translation_rate"] = stats["translation_views"] / views
+    marked = stats["remembered"] + stats["repeats"]
+    stats["difficulty"] = stats["repeats"] / marked.where(marked > 0)
+    return stats.sort_values(["difficulty", "avg_dwell"], ascending=False)
+
+
+@st.cache_resource(show_spinner=False)
+def get_deck_watcher():
+    """Deck state shared by all sessions; refreshed when data.py changes."""
+    return {"lock": threading.Lock(), "mtime": None, "deck": None, "renames": []}
+
+
+def diff_deck(old_cards, new_cards):
+    """Compares two decks card by card.
+
+    A question that disappeared is treated as renamed only when a new question
+    has the same answer; anything else is a removal plus an addition.
+    """
+    removed = [key for key in old_cards if key not in new_cards]
+    added = [key for key in new_cards if key not in old_cards]
+    renamed = {}
+    by_answer = {new_cards[key]: key for key in added}
+    for key in removed:
+        new_key = by_answer.pop(old_cards[key], None)
+        if new_key is not None:
+            renamed[key] = new_key
+    changed_answers = [key for key in old_cards if key in new_cards and old_cards[key] != new_cards[key]]
+    return {"removed": removed, "renamed": renamed, "changed_answers": changed_answers}
+
+
+def invalidate_audio(texts):
+    """Drops cached audio only for texts that are no longer in the deck."""
+    for text in texts:
+        generate_audio_bytes.clear(text)
+
+
+def load_deck():
+    """Returns the current deck, reloading data.py if it changed on disk.
+
+    If the edited file fails to load, the previous deck keeps being served
+    until the next save. If applying the changes fails, the reload is retried
+    on the next run, since the deck and mtime are only updated at the end.
+    """
+    watcher = get_deck_watcher()
+    mtime = os.path.getmtime(DATA_PATH)
+    with watcher["lock"]:
+        if watcher["mtime"] != mtime:
+            try:
+                module = importlib.reload(data) if watcher["deck"] is not None else data
+                deck = {
+                    "cards": dict(module.flashcard_data),
+                    "translations": dict(module.thai_translations),
+                    "quotes": list(module.thai_quotes),
+                }
+            except Exception as e:
+                print(f"Error reloading deck: {e}")
+                watcher["mtime"] = mtime
+                return watcher["deck"], tuple(watcher["renames"])
+            try:
+                if watcher["deck"] is not None:
+                    old_cards = watcher["deck"]["cards"]
+                    changes = diff_deck(old_cards, deck["cards"])
+                    new_texts = set(deck["cards"]) | set(deck["cards"].values())
+                    invalidate_audio(text for text in (*changes["removed"],
+                                                       *(old_cards[key] for key in changes["removed"]),
+                                                       *(old_cards[key] for key in changes["changed_answers"]))
+                                     if text not in new_texts)
+                    rename_card_events(changes["renamed"])
+                    watcher["renames"].append(changes["renamed"])
+                watcher["deck"] = deck
+                watcher["mtime"] = mtime
+            except Exception as e:
+                print(f"Error applying deck changes: {e}")
+        return watcher["deck"], tuple(watcher["renames"])
+
+
+def sync_session_with_deck(deck_renames):
+    """Remaps this session's range and progress onto a reloaded deck."""
+    pending_renames = deck_renames[st.session_state.deck_version:]
+    if pending_renames:
+        def remap(key):
+            for renames in pending_renames:
+                key = renames.get(key, key)
+            return key
+
+        current_key = None
+        if st.session_state.card_keys:
+            current_key = remap(st.session_state.card_keys[st.session_state.current_index])
+        listen_key = None
+        if st.session_state.listen_mode:
+            listen_key = remap(st.session_state.card_keys[st.session_state.listen_index])
+        st.session_state.card_keys = [remap(key) for key in st.session_state.card_keys
+                                      if remap(key) in flashcard_data]
+        st.session_state.card_status = {remap(key): status
+                                        for key, status in st.session_state.card_status.items()
+                                        if remap(key) in flashcard_data}
+        st.session_state.total_cards = len(st.session_state.card_keys)
+        if current_key in st.session_state.card_keys:
+            st.session_state.current_index = st.session_state.card_keys.index(current_key)
+        else:
+            st.session_state.current_index = min(st.session_state.current_index,
+                                                 max(st.session_state.total_cards - 1, 0))
+            st.session_state.is_flipped = False
+            st.session_state.show_thai_translation = None
+            start_card_view()
+        st.session_state.audio_to_play = None
+        if st.session_state.listen_mode:
+            if listen_key in st.session_state.card_keys:
+                st.session_state.listen_index = st.session_state.card_keys.index(listen_key)
+            elif st.session_state.card_keys:
+                # The card being played was removed: continue with the one that took its place.
+                st.session_state.listen_index = min(st.session_state.listen_index,
+                                                    st.session_state.total_cards - 1)
+                st.session_state.listen_clip_started_at = None
+                st.session_state.listen_clip_sent = False
+            else:
+                stop_listening()
+            st.session_state.listen_prefetch = {}
+    for key in flashcard_data:
+        st.session_state.card_status.setdefault(key, "Не просмотрено")
+    st.session_state.deck_version = len(deck_renames)
+
+
+def initialize_session_state(deck_renames):
     """Initializes session state variables if they don't exist."""
     if 'card_keys' not in st.session_state:
         st.session_state.card_keys = list(flashcard_data.keys())
@@ -45,6 +495,16 @@ def initialize_session_state():
     # <-- NEW: State to manage visibility of the Thai translation
     if 'show_thai_translation' not in st.session_state:
         st.session_state.show_thai_translation = None # Can be None, 'question', or 'answer'
+    if 'listen_mode' not in st.session_state:
+        stop_listening()
+    if 'event_buffer' not in st.session_state:
+        st.session_state.event_buffer = new_event_buffer()
+        st.session_state.events_written = 0
+        st.session_state.events_flushed = 0
+    if 'view_logged' not in st.session_state:
+        start_card_view()
+    if 'deck_version' not in st.session_state:
+        st.session_state.deck_version = len(deck_renames)
 
 
 def apply_range(start_num, end_num):
@@ -53,6 +513,8 @@ def apply_range(start_num, end_num):
     end_idx = end_num
     all_keys = list(flashcard_data.keys())
     if 0 <= start_idx < end_idx <= len(all_keys):
+        end_card_view("finish")
+        flush_review_events()
         st.session_state.card_keys = all_keys[start_idx:end_idx]
         if st.session_state.shuffle_on:
             random.shuffle(st.session_state.card_keys)
@@ -61,29 +523,38 @@ def apply_range(start_num, end_num):
         st.session_state.is_flipped = False
         st.session_state.audio_to_play = None
         st.session_state.show_thai_translation = None # <-- NEW: Reset on applying range
+        stop_listening()
     else:
         st.sidebar.error("Неверный диапазон. Пожалуйста, выберите корректные номера.")
 
 
 def next_card():
     if st.session_state.current_index < st.session_state.total_cards - 1:
+        end_card_view("next")
         st.session_state.current_index += 1
         st.session_state.is_flipped = False
         st.session_state.audio_to_play = None
         st.session_state.show_thai_translation = None # <-- NEW: Hide translation on next card
+        start_card_view()
 
 
 def prev_card():
     if st.session_state.current_index > 0:
+        end_card_view("prev")
         st.session_state.current_index -= 1
         st.session_state.is_flipped = False
         st.session_state.audio_to_play = None
         st.session_state.show_thai_translation = None # <-- NEW: Hide translation on previous card
+        start_card_view()
 
 
 def mark_status(status):
     current_key = st.session_state.card_keys[st.session_state.current_index]
     st.session_state.card_status[current_key] = status
+    log_review_event("remembered" if status == "Запомнено" else "repeat")
+    if st.session_state.current_index == st.session_state.total_cards - 1:
+        end_card_view("finish")
+    flush_review_events()
 
 
 # --- UI Layout ---
@@ -157,7 +628,14 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-initialize_session_state()
+deck, deck_renames = load_deck()
+flashcard_data = deck["cards"]
+thai_translations = deck["translations"]
+thai_quotes = deck["quotes"]
+initialize_session_state(deck_renames)
+sync_session_with_deck(deck_renames)
+# Events logged by the callbacks of the previous interaction are already in the buffer.
+maybe_flush_review_events()
 
 # --- Sidebar Controls ---
 with st.sidebar:
@@ -178,6 +656,18 @@ with st.sidebar:
     if st.button("Сбросить прогресс", use_container_width=True):
         st.session_state.card_status = {key: "Не просмотрено" for key in list(flashcard_data.keys())}
         st.rerun()
+    st.header("📈 Аналитика")
+    st.toggle("Показать сложные карточки", key="show_analytics",
+              help="Статистика ответов всех учеников по каждой карточке.")
+    st.header("🎧 Прослушивание")
+    if st.session_state.listen_mode:
+        if st.button("⏹️ Остановить", use_container_width=True):
+            stop_listening()
+            st.rerun()
+    elif st.button("Слушать весь диапазон", use_container_width=True, disabled=not st.session_state.card_keys,
+                   help="Вопрос, пауза, ответ — для каждой карточки выбранного диапазона."):
+        start_listening()
+        st.rerun()
 
 # --- Main Flashcard Area ---
 st.title("🗂️ Интерактивные Аудио-Карточки по Истории")
@@ -218,6 +708,8 @@ if current_time - st.session_state.last_popup_time >= 60 :
 # --- Flashcard Logic ---
 if not st.session_state.card_keys:
     st.warning("Нет карточек для отображения. Пожалуйста, выберите и примените диапазон в боковой панели.")
+elif st.session_state.listen_mode:
+    listen_player()
 else:
     current_key = st.session_state.card_keys[st.session_state.current_index]
     current_answer = flashcard_data[current_key]
@@ -248,6 +740,7 @@ else:
                     with st.spinner("Генерация аудио..."):
                         audio_uri = generate_audio(current_key)
                     st.session_state.audio_to_play = audio_uri
+                    st.session_state.audio_played = True
                     if not audio_uri:
                         st.toast("Ошибка генерации аудио!", icon="🚨")
             with col3:
@@ -256,6 +749,7 @@ else:
                         st.session_state.show_thai_translation = None
                     else:
                         st.session_state.show_thai_translation = "question"
+                        st.session_state.translation_viewed = True
                     st.rerun()
 
             if st.session_state.audio_to_play:
@@ -285,6 +779,7 @@ else:
                     with st.spinner("Генерация аудио..."):
                         audio_uri = generate_audio(current_answer)
                     st.session_state.audio_to_play = audio_uri
+                    st.session_state.audio_played = True
                     if not audio_uri:
                         st.toast("Ошибка генерации аудио!", icon="🚨")
             with col3:
@@ -293,6 +788,7 @@ else:
                         st.session_state.show_thai_translation = None
                     else:
                         st.session_state.show_thai_translation = "answer"
+                        st.session_state.translation_viewed = True
                     st.rerun()
 
             if st.session_state.audio_to_play:
@@ -317,4 +813,36 @@ else:
     with status_col1:
         st.button("✅ Я это знаю!", on_click=mark_status, args=("Запомнено",), use_container_width=True)
     with status_col2:
-        st.button("🔄 Нужно повторить", on_click=mark_status, args=("Нужно повторить",), use_container_width=True)
\ No newline at end of file
+        st.button("🔄 Нужно повторить", on_click=mark_status, args=("Нужно повторить",), use_container_width=True)
+
+# --- Analytics Dashboard ---
+if st.session_state.show_analytics:
+    st.divider()
+    st.header("📈 Сложные карточки")
+    flush_review_events()
+    analytics = load_card_analytics()
+    total_views = analytics["views"].sum()
+    if total_views == 0:
+        st.info("Пока нет данных о просмотрах карточек.")
+    else:
+        metric_col1, metric_col2, metric_col3 = st.columns(3)
+        metric_col1.metric("Просмотров", f"{total_views}")
+        metric_col2.metric("Среднее время на карточке",
+                           f"{analytics['dwell_total'].sum() / total_views:.1f} с")
+        metric_col3.metric("Использование перевода",
+                           f"{analytics['translation_views'].sum() / total_views:.0%}")
+        table = analytics[["question", "difficulty", "views", "avg_dwell", "translation_rate", "audio_rate"]].copy()
+        table[["translation_rate", "audio_rate"]] *= 100
+        st.dataframe(
+            table,
+            column_config={
+                "question": "Вопрос",
+                "difficulty": st.column_config.ProgressColumn("Сложность", min_value=0, max_value=1),
+                "views": "Просмотры",
+                "avg_dwell": st.column_config.NumberColumn("Время, с", format="%.1f"),
+                "translation_rate": st.column_config.NumberColumn("Перевод", format="%.0f%%"),
+                "audio_rate": st.column_config.NumberColumn("Аудио", format="%.0f%%"),
+            },
+            hide_index=True,
+            use_container_width=True,
+        )